@@ -1,61 +1,219 @@
 import csv
+import logging
+import sys
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from lxml import etree, html as lxml_html
 import re
-import json
+import orjson
+from operator import itemgetter
+from urllib.parse import urlencode
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+log = logging.getLogger("formbot")
+
+# Upper bound on form submissions in flight at once.
+MAX_CONCURRENT_SUBMISSIONS = 64
+
+# Rows read ahead of the submitters; bounds memory while the CSV is streamed.
+MAX_PENDING_SUBMISSIONS = 2 * MAX_CONCURRENT_SUBMISSIONS
+
+# Compiled once; used to pull questions out of the form page, which Google serves as UTF-8.
+_HTML_PARSER = lxml_html.HTMLParser(encoding='utf-8')
+_LISTITEM_XPATH = etree.XPath('//div[@role="listitem"]')
+_QUESTION_SPAN_XPATH = etree.XPath('(.//span)[1]')
+_DATA_PARAMS_DIV_XPATH = etree.XPath('(.//div[@data-params])[1]')
+
+# Google embeds the whole form schema in the page as a JS array literal.
+# The live page ends it as ']\n;</script>', so allow whitespace before the semicolon.
+_LOAD_DATA_RE = re.compile(rb'FB_PUBLIC_LOAD_DATA_\s*=\s*(\[.*?\])\s*;\s*</script>', re.DOTALL)
+
+# Form bodies are encoded up front, so every submission shares this header dict.
+_FORM_HEADERS = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+# Seconds to wait on Google before giving up on a request.
+REQUEST_TIMEOUT = 30
+
+
+class _SubmissionRetry(Retry):
+    """Retry that only repeats a POST on statuses Google sends before storing a response.
+
+    Form submissions are not idempotent: after a 500/502/504 the response may
+    already be recorded, so retrying could submit the row twice. 429 and 503
+    are returned before the submission is processed and are safe to repeat.
+    """
+
+    POST_RETRY_STATUSES = frozenset([429, 503])
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method == 'POST' and status_code not in self.POST_RETRY_STATUSES:
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+def create_session():
+    """Creates an HTTP session that pools connections to docs.google.com."""
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=MAX_CONCURRENT_SUBMISSIONS,
+        # urllib3 does not retry POST by default; submissions need it to ride out throttling.
+        # read=False: a read error or timeout means the body was already sent, so never resend
+        # it, and re-raise the original error (e.g. ReadTimeout) rather than "Max retries exceeded".
+        max_retries=_SubmissionRetry(
+            total=5,
+            read=False,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=['GET', 'POST'],
+            respect_retry_after_header=True,
+        ),
+    ))
+    return session
+
 
 def sanitize_for_regex(text):
     """Sanitizes text for use in regular expressions."""
     return re.escape(text)
 
-def csv_to_google_form(csv_filepath, form_url, field_mappings):
+
+def _compile_regex_patterns(regex_patterns):
+    """Fuses each CSV column's patterns into one regex per score, highest score first.
+
+    Returns {csv_col: (tiers, reverse_patterns)} where tiers is a list of
+    (score, compiled) covering 'exact' and 'contains' patterns, and
+    reverse_patterns is a list of (score, pattern) for 'reverse_contains'.
+    """
+    compiled_patterns = {}
+    for csv_col, patterns in regex_patterns.items():
+        alternatives_by_score = {}
+        reverse_patterns = []
+        for pattern_data in patterns:
+            pattern = pattern_data['pattern']
+            score = pattern_data['score']
+            match_type = pattern_data.get('match_type', 'contains')
+            if match_type == 'exact':
+                alternatives_by_score.setdefault(score, []).append(r"^" + sanitize_for_regex(pattern) + r"$")
+            elif match_type == 'contains':
+                alternatives_by_score.setdefault(score, []).append(sanitize_for_regex(pattern))
+            elif match_type == 'reverse_contains':
+                reverse_patterns.append((score, pattern))
+
+        tiers = []
+        for score in sorted(alternatives_by_score, reverse=True):
+            try:
+                tiers.append((score, re.compile("|".join(alternatives_by_score[score]), re.IGNORECASE)))
+            except re.error as e:
+                print(f"Warning: Invalid regex pattern for CSV column '{csv_col}': {e}")
+        compiled_patterns[csv_col] = (tiers, reverse_patterns)
+
+    return compiled_patterns
+
+
+def _tuple_getter(indices):
+    """Like itemgetter(*indices), but always returns a tuple."""
+    if not indices:
+        return lambda row: ()
+    if len(indices) == 1:
+        index = indices[0]
+        return lambda row: (row[index],)
+    return itemgetter(*indices)
+
+
+def _form_body_builder(header, field_mappings, single_name_field):
+    """Returns a function that turns one CSV row into an urlencoded form body.
+
+    When single_name_field is set, firstname and lastname are combined into
+    that field instead of being submitted separately.
+    """
+    name_columns = ('firstname', 'lastname') if single_name_field else ()
+    form_entry_ids = []
+    indices = []
+    for csv_column, form_entry_id in field_mappings.items():
+        if csv_column in header and csv_column not in name_columns:
+            form_entry_ids.append(form_entry_id)
+            indices.append(header.index(csv_column))
+    get_values = _tuple_getter(indices)
+    get_names = _tuple_getter([header.index(c) for c in name_columns if c in header])
+    width = len(header)
+
+    def build_body(row):
+        if len(row) < width:
+            row = row + [""] * (width - len(row))
+        form_data = list(zip(form_entry_ids, get_values(row)))
+        if single_name_field:
+            form_data.append((single_name_field, " ".join(get_names(row)).strip()))
+        return urlencode(form_data).encode()
+
+    return build_body
+
+
+def _post_form(session, form_response_url, body):
+    """Submits one encoded form body, keeping only the status code of the response."""
+    response = session.post(
+        form_response_url, data=body, headers=_FORM_HEADERS, timeout=REQUEST_TIMEOUT,
+    )
+    response.raise_for_status()
+    return response.status_code
+
+
+def _collect_submissions(done, pending):
+    """Reports finished submissions and drops them from pending. Returns how many succeeded."""
+    succeeded = 0
+    for future in done:
+        row_number, row = pending.pop(future)
+        try:
+            future.result()
+            succeeded += 1
+            log.debug("Submitted row %d", row_number)
+        except requests.exceptions.RequestException as e:
+            print(f"Error submitting data for row {row_number} {row}: {e}")
+    return succeeded
+
+
+def csv_to_google_form(csv_filepath, form_url, field_mappings, session):
     """Reads data from CSV, submits to Google Form, handles name combining."""
     try:
         form_response_url = form_url.replace('/viewform', '/formResponse')
-        all_submissions_successful = True
 
         with open(csv_filepath, 'r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                form_data = {}
-
-                # --- Name Combining Logic ---
-                if 'firstname' in field_mappings and 'lastname' in field_mappings:
-                    # Separate firstname and lastname fields exist.  Fill normally.
-                    for csv_column, form_entry_id in field_mappings.items():
-                        form_data[form_entry_id] = row.get(csv_column, "")
-                else:
-                    # Check for a single name-related field.
-                    single_name_field = None
-                    for form_label, entry_id in entry_ids.items():  # Use entry_ids
-                        if 'firstname' in mappings and mappings['firstname'] == entry_id:
-                            single_name_field = entry_id
-                            break  # Found the single name field (mapped to firstname).
-
-                    if single_name_field:
-                        # Combine firstname and lastname (if available).
-                        firstname = row.get('firstname', '')
-                        lastname = row.get('lastname', '')
-                        combined_name = f"{firstname} {lastname}".strip()
-                        form_data[single_name_field] = combined_name
-
-                        # Fill other non-name fields.
-                        for csv_column, form_entry_id in field_mappings.items():
-                            if csv_column not in ('firstname', 'lastname'):
-                                form_data[form_entry_id] = row.get(csv_column, "")
-                    else:
-                        # No name field found (or only lastname).  Fill all as usual.
-                        for csv_column, form_entry_id in field_mappings.items():
-                            form_data[form_entry_id] = row.get(csv_column, "")
-                # --- End Name Combining Logic ---
-
-                try:
-                    response = requests.post(form_response_url, data=form_data)
-                    response.raise_for_status()
-                    print(f"Successfully submitted data for row: {row}")
-                except requests.exceptions.RequestException as e:
-                    print(f"Error submitting data for row {row}: {e}")
-                    all_submissions_successful = False
+            reader = csv.reader(csvfile)
+            header = next(reader, [])
+
+            # --- Name Combining Logic ---
+            # The name layout is the same for every row, so resolve it once.
+            single_name_field = None
+            if not ('firstname' in field_mappings and 'lastname' in field_mappings):
+                # Check for a single name-related field.
+                for form_label, entry_id in entry_ids.items():  # Use entry_ids
+                    if 'firstname' in mappings and mappings['firstname'] == entry_id:
+                        single_name_field = entry_id
+                        break  # Found the single name field (mapped to firstname).
+            # --- End Name Combining Logic ---
+
+            build_body = _form_body_builder(header, field_mappings, single_name_field)
+
+            # Submissions are independent and I/O-bound, so send them concurrently
+            # while the CSV is still being read.
+            with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_SUBMISSIONS) as executor:
+                pending = {}
+                row_number = 0
+                submitted = 0
+                for row in reader:
+                    if not row:
+                        continue
+                    if len(pending) >= MAX_PENDING_SUBMISSIONS:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        submitted += _collect_submissions(done, pending)
+                    row_number += 1
+                    future = executor.submit(_post_form, session, form_response_url, build_body(row))
+                    pending[future] = (row_number, row)
+
+                submitted += _collect_submissions(as_completed(pending), pending)
+
+            print(f"Submitted {submitted} of {row_number} rows.")
+            all_submissions_successful = submitted == row_number
 
         return all_submissions_successful
 
@@ -67,43 +225,93 @@ def csv_to_google_form(csv_filepath, form_url, field_mappings):
         return False
 
 
-def get_form_entry_ids(form_url):
+def _entry_ids_from_load_data(content):
+    """Reads entry IDs from the FB_PUBLIC_LOAD_DATA_ JSON embedded in the form page."""
+    match = _LOAD_DATA_RE.search(content)
+    if not match:
+        return None
+    try:
+        fields = orjson.loads(match.group(1))[1][1]
+    except (ValueError, IndexError, TypeError) as e:
+        print(f"Warning: Could not parse FB_PUBLIC_LOAD_DATA_: {e}")
+        return None
+
+    entry_ids = {}
+    # Each field is [item_id, label, description, type, [[entry_id, ...], ...], ...].
+    # Items without answers (section headers, images, videos) have no entry list.
+    for field in fields or []:
+        try:
+            label = field[1]
+            entry_number = field[4][0][0]
+        except (IndexError, TypeError):
+            continue
+        if label and isinstance(entry_number, int):
+            entry_ids[label.strip()] = "entry." + str(entry_number)
+
+    if not entry_ids:
+        print("Warning: FB_PUBLIC_LOAD_DATA_ had no recognizable fields; falling back to the page HTML.")
+    return entry_ids
+
+
+def _entry_number_from_data_params(data_params):
+    """Returns the entry ID digits from a question's data-params, or '' if none are found.
+
+    data-params looks like '%.@.[123,"Label",...,[[456,...' where 456 is the entry ID.
+    The label may itself contain '[[', so skip any '[[' not followed by a digit.
+    """
+    idx = data_params.find('[[')
+    while idx != -1:
+        start = end = idx + 2
+        while end < len(data_params) and data_params[end] in '0123456789':
+            end += 1
+        if end > start:
+            return data_params[start:end]
+        idx = data_params.find('[[', start)
+    return ''
+
+
+def _entry_ids_from_dom(content):
+    """Reads entry IDs by walking the question elements of the form page."""
+    root = lxml_html.fromstring(content, parser=_HTML_PARSER)
+    entry_ids = {}
+    list_items = _LISTITEM_XPATH(root)
+
+    for item in list_items:
+        question_spans = _QUESTION_SPAN_XPATH(item)
+        if not question_spans:
+            print("Warning: Could not find question span. Skipping.")
+            continue
+        question_text = question_spans[0].text_content().strip()
+
+        parent_divs = _DATA_PARAMS_DIV_XPATH(item)
+        if not parent_divs:
+            print(f"Warning: No parent div with data-params for '{question_text}'. Skipping.")
+            continue
+
+        data_params = parent_divs[0].get('data-params')
+        if not data_params:
+            print(f"Warning: 'data-params' attribute empty for '{question_text}'. Skipping.")
+            continue
+
+        entry_number = _entry_number_from_data_params(data_params)
+        if not entry_number:
+            print(f"Warning: Could not extract entry ID from data-params for '{question_text}'. Skipping.")
+            continue
+        entry_id = "entry." + entry_number
+        entry_ids[question_text] = entry_id
+
+    return entry_ids
+
+
+def get_form_entry_ids(form_url, session):
     """Extracts entry IDs and field labels from a Google Form."""
     try:
-        response = requests.get(form_url)
+        response = session.get(form_url, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        entry_ids = {}
-        list_items = soup.find_all('div', role='listitem')
-
-        for item in list_items:
-            question_span = item.find('span')
-            if not question_span:
-                print("Warning: Could not find question span. Skipping.")
-                continue
-            question_text = question_span.text.strip()
-
-            parent_div = item.find('div', {'data-params': True})
-            if not parent_div:
-                print(f"Warning: No parent div with data-params for '{question_text}'. Skipping.")
-                continue
-
-            data_params = parent_div.get('data-params')
-            if not data_params:
-                print(f"Warning: 'data-params' attribute empty for '{question_text}'. Skipping.")
-                continue
-
-            try:
-                match = re.search(r'\[\[(\d+)', data_params)
-                if match:
-                    entry_id = "entry." + match.group(1)
-                else:
-                    print(f"Warning: Could not extract entry ID from data-params for '{question_text}'. Skipping.")
-                    continue
-            except (ValueError, IndexError) as e:
-                print(f"Warning: Error parsing data-params for '{question_text}': {e}. Skipping.")
-                continue
-            entry_ids[question_text] = entry_id
+        entry_ids = _entry_ids_from_load_data(response.content)
+        if not entry_ids:
+            # The form data may be missing or laid out differently; fall back to the DOM.
+            entry_ids = _entry_ids_from_dom(response.content)
 
         return entry_ids if entry_ids else None
 
@@ -115,54 +323,64 @@ def get_form_entry_ids(form_url):
         return None
 
 
+def _score_column(entry_id_dict, tiers, reverse_patterns, label_patterns):
+    """Scores one CSV column against every form field, returning {entry_id: score}."""
+    scores = {}
+    for form_label, entry_id in entry_id_dict.items():
+        best_score = 0
+
+        # Tiers run from the highest score down, so the first hit is this label's best.
+        for score, compiled in tiers:
+            if compiled.search(form_label):
+                best_score = score
+                break
+
+        for score, pattern in reverse_patterns:
+            if score > best_score and label_patterns[form_label].search(pattern):
+                best_score = score
+
+        if best_score > scores.get(entry_id, 0):
+            scores[entry_id] = best_score
+
+    return scores
+
+
 def find_matching_keys_with_regex(entry_id_dict, csv_header, regex_patterns_file):
     """Maps CSV column names to form field labels using regex from a JSON file."""
     try:
-        with open(regex_patterns_file, 'r', encoding='utf-8') as f:
-            regex_patterns = json.load(f)
+        with open(regex_patterns_file, 'rb') as f:
+            regex_patterns = orjson.loads(f.read())
     except FileNotFoundError:
         print(f"Error: Regex patterns file not found: '{regex_patterns_file}'")
         return {}
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         print(f"Error: Invalid JSON format in '{regex_patterns_file}'")
         return {}
 
+    compiled_patterns = _compile_regex_patterns(regex_patterns)
+
+    # For 'reverse_contains' the form label is the pattern; compile each one once for all columns.
+    label_patterns = {}
+    if any(reverse_patterns for _, reverse_patterns in compiled_patterns.values()):
+        label_patterns = {
+            form_label: re.compile(sanitize_for_regex(form_label), re.IGNORECASE)
+            for form_label in entry_id_dict
+        }
+
     mappings = {}
     used_entry_ids = set()
 
     for csv_col in csv_header:
+        tiers, reverse_patterns = compiled_patterns.get(csv_col, ([], []))
+        scores = _score_column(entry_id_dict, tiers, reverse_patterns, label_patterns)
+
+        # Greedy in header order: take the best-scoring entry not already claimed.
         best_match = None
         best_score = 0
-
-        for form_label, entry_id in entry_id_dict.items():
-            if entry_id in used_entry_ids:
-                continue
-
-            for pattern_data in regex_patterns.get(csv_col, []):
-                pattern = pattern_data['pattern']
-                score = pattern_data['score']
-                match_type = pattern_data.get('match_type', 'contains')
-
-                try:
-                    if match_type == 'exact':
-                      if re.search(r"^" + sanitize_for_regex(pattern) + r"$", form_label, re.IGNORECASE):
-                          if score > best_score:
-                              best_score = score
-                              best_match = entry_id
-                    elif match_type == 'contains':
-                        if re.search(sanitize_for_regex(pattern), form_label, re.IGNORECASE):
-                            if score > best_score:
-                                best_score = score
-                                best_match = entry_id
-                    elif match_type == 'reverse_contains':
-                        if re.search(sanitize_for_regex(form_label), pattern, re.IGNORECASE):
-                            if score > best_score:
-                                best_score = score
-                                best_match = entry_id
-
-                except re.error as e:
-                    print(f"Warning: Invalid regex pattern '{pattern}' for CSV column '{csv_col}': {e}")
-                    continue
+        for entry_id, score in scores.items():
+            if score > best_score and entry_id not in used_entry_ids:
+                best_score = score
+                best_match = entry_id
 
         if best_match:
             mappings[csv_col] = best_match
@@ -176,52 +394,60 @@ def main():
     form_url = "FORM_PLACEHOLDER" # Add your form URL here
     regex_patterns_file = "regex_patterns.json"
 
-    print("\nAttempting to automatically extract form entry IDs...")
-    global entry_ids
-    entry_ids = get_form_entry_ids(form_url)
+    # Per-row submission messages are debug-level; pass --verbose to see them.
+    # Only the formbot logger goes to DEBUG so urllib3's per-request chatter stays hidden.
+    logging.basicConfig(format="%(message)s", level=logging.INFO)
+    if "--verbose" in sys.argv[1:]:
+        log.setLevel(logging.DEBUG)
 
-    if entry_ids:
-        print("\nExtracted Form Entry IDs:")
-        for label, entry_id in entry_ids.items():
-            print(f"  {label}: {entry_id}")
+    # One session for the form fetch and every submission keeps the connection warm.
+    with create_session() as session:
+        print("\nAttempting to automatically extract form entry IDs...")
+        global entry_ids
+        entry_ids = get_form_entry_ids(form_url, session)
 
-        try:
-            with open(csv_filepath, 'r', encoding='utf-8') as csvfile:
-                reader = csv.reader(csvfile)
-                csv_header = next(reader)
-        except FileNotFoundError:
-            print(f"Error: CSV file not found at {csv_filepath}")
-            return
-        except Exception as e:
-            print(f"Error opening CSV file: {e}")
-            return
-
-        print("\nCSV Header Columns:")
-        for col in csv_header:
-            print(f"  {col}")
-
-        print("\nAttempting to automatically map CSV columns to form fields using Regex...")
-        global mappings
-        mappings = find_matching_keys_with_regex(entry_ids, csv_header, regex_patterns_file)
-
-        if not mappings:
-            print("\nNo mappings could be determined. Exiting.")
-            return
-
-        print("\nRegex Mappings:")
-        for csv_col, entry_id in mappings.items():
-            print(f"  {csv_col}: {entry_id}")
-
-        print("\nSubmitting data to Google Form...")
-        success = csv_to_google_form(csv_filepath, form_url, mappings)
-
-        if success:
-            print("\nAll data submitted successfully!")
-        else:
-            print("\nSome submissions failed. See error messages above.")
+        if entry_ids:
+            print("\nExtracted Form Entry IDs:")
+            for label, entry_id in entry_ids.items():
+                print(f"  {label}: {entry_id}")
 
-    else:
-        print("\nAutomatic extraction failed. Exiting.")
+            try:
+                with open(csv_filepath, 'r', encoding='utf-8') as csvfile:
+                    reader = csv.reader(csvfile)
+                    csv_header = next(reader)
+            except FileNotFoundError:
+                print(f"Error: CSV file not found at {csv_filepath}")
+                return
+            except Exception as e:
+                print(f"Error opening CSV file: {e}")
+                return
+
+            print("\nCSV Header Columns:")
+            for col in csv_header:
+                print(f"  {col}")
+
+            print("\nAttempting to automatically map CSV columns to form fields using Regex...")
+            global mappings
+            mappings = find_matching_keys_with_regex(entry_ids, csv_header, regex_patterns_file)
+
+            if not mappings:
+                print("\nNo mappings could be determined. Exiting.")
+                return
+
+            print("\nRegex Mappings:")
+            for csv_col, entry_id in mappings.items():
+                print(f"  {csv_col}: {entry_id}")
+
+            print("\nSubmitting data to Google Form...")
+            success = csv_to_google_form(csv_filepath, form_url, mappings, session)
+
+            if success:
+                print("\nAll data submitted successfully!")
+            else:
+                print("\nSome submissions failed. See error messages above.")
+
+        else:
+            print("\nAutomatic extraction failed. Exiting.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,47 @@
+import os
+import re
+
+import bot
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "viewform.html")
+
+EXPECTED = {
+    "ชื่อ": "entry.1000001",
+    "Pick [[A]] or [[B]]": "entry.1000002",
+    "Email": "entry.1000003",
+}
+
+
+class _Response:
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+class _Session:
+    def __init__(self, content):
+        self.content = content
+
+    def get(self, url, **kwargs):
+        return _Response(self.content)
+
+
+def _saved_page():
+    with open(FIXTURE, "rb") as f:
+        return f.read()
+
+
+def test_entry_ids_from_load_data():
+    assert bot._entry_ids_from_load_data(_saved_page()) == EXPECTED
+
+
+def test_entry_ids_from_dom():
+    assert bot._entry_ids_from_dom(_saved_page()) == EXPECTED
+
+
+def test_get_form_entry_ids_falls_back_to_dom():
+    page = re.sub(rb"<script.*?</script>", b"", _saved_page(), flags=re.DOTALL)
+    assert bot._entry_ids_from_load_data(page) is None
+    assert bot.get_form_entry_ids("https://example.invalid/viewform", _Session(page)) == EXPECTED